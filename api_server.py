@@ -1,4 +1,19 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import hashlib
+import importlib.util
+import json
+from functools import lru_cache
+
+from fastapi import FastAPI, HTTPException, Response
+
+# uvloopが入っていればイベントループをlibuv実装に差し替える
+# （I/Oバウンドなエンドポイントのsyscall・コンテキストスイッチのコストを下げる。
+# uvicornのauto検出に加え、他のASGIサーバで起動された場合もカバーする）
+if importlib.util.find_spec("uvloop") is not None:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+import config
 from schemas import (
     InterpolationRequest,
     InterpolationResponse,
@@ -6,13 +21,60 @@ from schemas import (
     IngestResponse,
     DiaryResponse
 )
-from orchestrator import orchestrator_instance
-from ingest import ingest_diaries, get_diary_by_date
+
+
+# orchestrator/ingestはtorchやSentenceTransformerを引き込んで起動が数秒延びるため、
+# 最初のリクエストまでインポートを遅延させる（結果はキャッシュされ2回目以降はdict引きのみ）
+@lru_cache(maxsize=1)
+def _get_orchestrator():
+    from orchestrator import orchestrator_instance
+    return orchestrator_instance
+
+
+@lru_cache(maxsize=1)
+def _get_ingest_module():
+    import ingest
+    return ingest
+
+
+# LLM生成はこのAPIで唯一の高コスト処理なので、同一リクエストの再実行は
+# 永続キャッシュから返す。diskcacheが無い環境ではプロセス内dictで代用する。
+_LLM_CACHE_EXPIRE_SECONDS = 7 * 86400
+
+
+@lru_cache(maxsize=1)
+def _get_llm_cache():
+    if importlib.util.find_spec("diskcache") is not None:
+        from diskcache import Cache
+        return Cache("./data/llm_cache")
+    return {}
+
+
+def _interpolation_cache_key(req: InterpolationRequest) -> str:
+    # モデル名とサンプリングパラメータもキーに含める
+    # （設定を変えたら別の生成として扱うため）
+    payload = {
+        "date": req.date,
+        "hint": req.hint,
+        "model": config.INTERPOLATION_MODEL_NAME,
+        "temperature": config.INTERPOLATION_TEMPERATURE,
+        "top_p": config.INTERPOLATION_TOP_P,
+        "max_new_tokens": config.INTERPOLATION_MAX_NEW_TOKENS,
+    }
+    serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()
+    return hashlib.blake2b(serialized, digest_size=16).hexdigest()
+
+# orjsonが入っていればレスポンスのJSONエンコードをC実装に任せる
+if importlib.util.find_spec("orjson") is not None:
+    from fastapi.responses import ORJSONResponse as _DefaultResponseClass
+else:
+    from fastapi.responses import JSONResponse as _DefaultResponseClass
 
 app = FastAPI(
     title="AI日記補完API",
     description="このAPIは、日記エントリを補間・管理するためのエンドポイントを提供します。",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=_DefaultResponseClass,
 )
 
 @app.post("/interpolate", response_model=InterpolationResponse)
@@ -21,7 +83,20 @@ def interpolate_diary(req: InterpolationRequest):
     指定された日付とヒントに基づき、日記の補間を行う
     """
     try:
-        response = orchestrator_instance.interpolate(req)
+        cache = _get_llm_cache()
+        key = _interpolation_cache_key(req)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        response = _get_orchestrator().interpolate(req)
+        # フォールバック出力（LLM失敗・自己検査棄却・検索エラー）は一時的な
+        # 劣化状態なので永続キャッシュに載せず、バックエンド回復後の
+        # 正規の生成で改めて埋めさせる
+        if not response.fallback:
+            if isinstance(cache, dict):
+                cache[key] = response
+            else:
+                cache.set(key, response, expire=_LLM_CACHE_EXPIRE_SECONDS)
         return response
     except Exception as e:
         # 実際の運用では、より詳細なエラーロギングを行う
@@ -36,7 +111,7 @@ def add_diary_entries(req: IngestRequest):
     if not req.diaries:
         raise HTTPException(status_code=400, detail="No diaries provided to ingest.")
     try:
-        ingest_diaries(req.diaries)
+        _get_ingest_module().ingest_diaries(req.diaries)
         return IngestResponse(
             status="success",
             ingested_count=len(req.diaries)
@@ -51,7 +126,7 @@ def read_diary(date: str):
     指定された日付の日記エントリをSQLiteから取得する
     """
     try:
-        diary = get_diary_by_date(date)
+        diary = _get_ingest_module().get_diary_by_date(date)
         if diary:
             # tagsがNoneでない場合は文字列からリストに変換する
             if diary.get("tags"):
@@ -63,7 +138,12 @@ def read_diary(date: str):
         print(f"Error reading diary for date {date}: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve diary.")
 
+# 固定レスポンスは毎回シリアライズせず、起動時に一度だけエンコードしておく
+# （ヘルスチェックやロードバランサから常時叩かれるエンドポイントのため）
+_ROOT_BYTES = json.dumps({"message": "Welcome to AI Diary Interpolation API"}).encode()
+
+
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to AI Diary Interpolation API"}
+    return Response(content=_ROOT_BYTES, media_type="application/json")
 
@@ -22,16 +22,25 @@ PROJECT_NAME = "AI Diary Interpolation"
 # --- Database ---
 # ingest.pyやapi_server.pyが参照するDBのパス
 SQLITE_DB_PATH = "./data/diary_enriched.sqlite"
+# enrich.py（天気・日の出キャッシュと閲覧用UI）専用のDBパス。
+# ingest.py側のdiary_entriesとはスキーマが異なるため、同じファイルを共有しない
+ENRICH_SQLITE_DB_PATH = os.environ.get("ENRICH_SQLITE_DB_PATH", "./data/enrich.sqlite")
 
 # --- Vector DB (Pinecone) ---
 PINECONE_API_KEY = os.environ.get("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = "diary-rag-index"
+# Upsertのチャンクサイズと並列リクエスト用のスレッド数（ingest.pyが参照）
+PINECONE_UPSERT_BATCH_SIZE = 200
+PINECONE_POOL_THREADS = 30
 
 # --- Embedding Model ---
 # ingest.pyとretriever.pyで同じモデル名を参照する
 EMBEDDING_MODEL_NAME = "intfloat/multilingual-e5-large"
 # モデルの出力次元数 (intfloat/multilingual-e5-largeは1024次元)
 EMBEDDING_DIMENSION = 1024
+# 埋め込み推論のバックエンド。"ct2"ならint8量子化のCTranslate2版を優先する
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "ct2")
+EMBEDDING_COMPUTE_TYPE = os.environ.get("EMBEDDING_COMPUTE_TYPE", "int8")
 
 # --- Retriever Settings ---
 # retriever.pyで使われる検索パラメータ
@@ -49,5 +58,8 @@ INTERPOLATION_MAX_NEW_TOKENS = int(os.environ.get("INTERPOLATION_MAX_NEW_TOKENS"
 INTERPOLATION_TEMPERATURE = float(os.environ.get("INTERPOLATION_TEMPERATURE", "0.7"))
 INTERPOLATION_TOP_P = float(os.environ.get("INTERPOLATION_TOP_P", "0.9"))
 INTERPOLATION_TASK = os.environ.get("INTERPOLATION_TASK", "text-generation")
+# 生成のバックエンド。"local"ならtransformersパイプライン（要オプション依存）、
+# それ以外（デフォルト"endpoint"）はHugging Faceエンドポイント経由
+INTERPOLATION_BACKEND = os.environ.get("INTERPOLATION_BACKEND", "endpoint")
 HUGGINGFACEHUB_API_TOKEN = os.environ.get("HUGGINGFACEHUB_API_TOKEN")
 
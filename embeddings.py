@@ -0,0 +1,53 @@
+"""埋め込みモデルのロードを一箇所に集約するモジュール。
+
+ingest.pyなどから使う。config.EMBEDDING_BACKEND が "ct2" で hf_hub_ctranslate2 が
+インストールされていれば、int8量子化されたCTranslate2版エンコーダを優先する
+（CPUでおよそ2〜4倍のスループット・約半分のメモリ）。入っていない環境では
+従来どおりSentenceTransformerにフォールバックする。
+"""
+import importlib.util
+
+# プロジェクト共通の設定をインポート
+import config
+
+
+def _cuda_available() -> bool:
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:  # pragma: no cover - ランタイム環境による
+        return False
+
+
+def load_embedding_model():
+    """設定に従って埋め込みモデルをロードして返す。
+
+    返り値は .encode(texts) を持つオブジェクト（CTranslate2版・SentenceTransformer
+    いずれも同じインターフェース）。
+    """
+    device = "cuda" if _cuda_available() else "cpu"
+
+    if (
+        config.EMBEDDING_BACKEND == "ct2"
+        and importlib.util.find_spec("hf_hub_ctranslate2") is not None
+    ):
+        # CT2SentenceTransformerはSentenceTransformerのサブクラスで、
+        # encode()やget_sentence_embedding_dimension()がそのまま使える
+        # （EncoderCT2fromHfHubはgenerate()しか持たず互換ではない）
+        from hf_hub_ctranslate2 import CT2SentenceTransformer
+        # GPUではint8の重み＋fp16演算、CPUでは純int8が最速
+        compute_type = "int8_float16" if device == "cuda" else config.EMBEDDING_COMPUTE_TYPE
+        print(f"Embeddings: Using CTranslate2 encoder ({compute_type}) on '{device}'.")
+        return CT2SentenceTransformer(
+            config.EMBEDDING_MODEL_NAME,
+            device=device,
+            compute_type=compute_type,
+        )
+
+    from sentence_transformers import SentenceTransformer
+    print(f"Embeddings: Using SentenceTransformer on '{device}'.")
+    model = SentenceTransformer(config.EMBEDDING_MODEL_NAME, device=device)
+    if device == "cuda":
+        # fp16にすると精度への影響はほぼ無しでメモリ帯域が半減し、スループットが約2倍になる
+        model = model.half()
+    return model
@@ -0,0 +1,877 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+enrich.py — 「日記の補間」PoC: 無料APIで日付・場所から天気/日の出入を取得し保存 + 日記閲覧UI
+  - Geocoding: Open-Meteo Geocoding API (no key)
+  - Historical Weather: Open-Meteo Weather API (no key)
+  - Sunrise/Sunset: sunrise-sunset.org (no key)
+保存先:
+  - config.SQLITE_DB_PATH (SQLite)
+
+同じ場所・日付の再検索は多いので、HTTPを叩く前に必ずSQLiteのキャッシュを確認する。
+ヒットすれば数百msのネットワーク往復が1回のインデックス付きSELECTになる。
+
+実行方法:
+  # 1) CLIモード
+  python enrich.py --cli --date 2025-03-21 --place 富山市
+  python enrich.py --cli --date 2025-03-21 --lat 36.695 --lon 137.213
+
+  # 2) UIモード（Streamlit）
+  python -m streamlit run enrich.py --server.port 8000 --server.address 0.0.0.0
+"""
+import argparse
+import atexit
+import datetime as dt
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - ランタイム環境による
+    orjson = None
+
+# プロジェクト共通の設定をインポート
+import config
+
+# ingest.pyのdiary_entries（date主キー）とは表の形が違うため、
+# 同じSQLiteファイルを共有せず専用のDBに書く
+DB_PATH = config.ENRICH_SQLITE_DB_PATH
+
+# リトライはurllib3に任せ、keep-aliveで接続（TLSハンドシェイク）を使い回す
+_ADAPTER = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(429, 500, 502, 503, 504),
+        respect_retry_after_header=True,
+    ),
+)
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "DiaryInterpolationPoC/0.2 (+example.org)"})
+SESSION.mount("https://", _ADAPTER)
+SESSION.mount("http://", _ADAPTER)
+
+# 日付文字列の形式チェック用。datetimeオブジェクトを作る前に不正入力を弾く
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# バルクヘッド: 外部APIへの同時リクエスト数の上限。
+# enrich_and_store_manyのファンアウト時に相手先へ過剰な並列を向けない
+_OUTBOUND_SEMAPHORE = threading.Semaphore(8)
+
+# キャッシュのキーに使う緯度経度の丸め桁数。
+# Open-Meteoは数km以内なら同一の日次データを返すため、2桁（≒1.1km）で十分であり、
+# 近傍座標のAPI呼び出しとSQLite行を同じキャッシュ行に集約できる
+_CACHE_NDIGITS = 2
+
+# プロセス内のホットキャッシュ。ensure_db() 時にSQLiteから先読みする
+_GEOCODE_HOT: Dict[str, Tuple[float, float, str]] = {}
+
+# フェッチ用のスレッドプール。呼び出しごとにThreadPoolExecutorを作ると
+# ワーカースレッドが使い捨てになり、各スレッドが開いたスレッドローカルの
+# SQLite接続が_ALL_CONNSに溜まり続けるため、モジュールに1組だけ持つ。
+# enrich_and_store_manyのファンアウト（外側）とenrich_and_store内の
+# 天気＋日の出入ペア（内側）が同じプールを共有すると、外側のタスクが
+# ワーカーを占有したまま内側の完了を待ってデッドロックするため分ける
+_MANY_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+_PAIR_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+
+__all__ = [
+    "ensure_db",
+    "enrich_and_store",
+    "enrich_and_store_many",
+    "geocode_place",
+    "fetch_daily_weather",
+    "fetch_daily_weather_range",
+    "fetch_sunrise_sunset",
+    "query_diaries",
+    "seed_demo_entries",
+]
+
+# スレッドごとに1本のSQLite接続を使い回す（接続open/closeとfsyncの往復を省く）
+_LOCAL = threading.local()
+_ALL_CONNS: list = []
+
+
+def _get_conn() -> sqlite3.Connection:
+    """スレッドローカルなWALモード接続を返す。初回のみPRAGMAを設定する。"""
+    con = getattr(_LOCAL, "con", None)
+    if con is None:
+        os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+        con = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+        con.executescript(
+            "PRAGMA journal_mode=WAL;"
+            "PRAGMA synchronous=NORMAL;"
+            "PRAGMA temp_store=MEMORY;"
+            "PRAGMA cache_size=-20000;"
+        )
+        _LOCAL.con = con
+        _ALL_CONNS.append(con)
+    return con
+
+
+@atexit.register
+def _close_all_conns():
+    for con in _ALL_CONNS:
+        try:
+            con.close()
+        except Exception:
+            pass
+    _ALL_CONNS.clear()
+
+
+# -----------------------------
+# Utilities
+# -----------------------------
+class _Breaker:
+    """ホスト単位のサーキットブレーカー（CLOSED/OPEN/HALF_OPEN）
+
+    連続threshold回失敗するとOPENになり、cooldown秒はHTTPを一切行わず即Noneで
+    失敗する（リトライ×バックオフの数秒を焼かない）。cooldown経過後の最初の
+    1回だけ試し（HALF_OPEN）、成功すればCLOSEDに戻る。
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        with self._lock:
+            if self.failures < self.threshold:
+                return False
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # HALF_OPEN: クールダウン明けの1回だけ通す
+                self.opened_at = time.monotonic()
+                return False
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+_BREAKERS: Dict[str, _Breaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def _breaker_for(url: str) -> _Breaker:
+    host = urlsplit(url).netloc
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(host)
+        if breaker is None:
+            breaker = _BREAKERS[host] = _Breaker()
+        return breaker
+
+
+def retry_get(url: str, params: Dict) -> Optional[requests.Response]:
+    """GETを実行し、失敗時はNoneを返す。リトライ・バックオフはアダプタ側で行われる
+
+    geocode_place / fetch_daily_weather / fetch_sunrise_sunset の全HTTPが
+    ここを通るため、サーキットブレーカーもこの1箇所で掛ける。
+    """
+    breaker = _breaker_for(url)
+    if breaker.is_open():
+        return None
+    try:
+        with _OUTBOUND_SEMAPHORE:
+            r = SESSION.get(url, params=params, timeout=15)
+        if r.status_code == 200:
+            breaker.record_success()
+            return r
+    except requests.RequestException:
+        pass
+    breaker.record_failure()
+    return None
+
+
+def dumps(obj) -> str:
+    """表示用のJSON整形。orjsonがあればC実装で高速にダンプする"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+    return json.dumps(obj, ensure_ascii=False, indent=2)
+
+
+def _parse_json(r: requests.Response) -> Dict:
+    """レスポンスボディをパースする。orjsonがあればSIMD対応のC実装を使う"""
+    if orjson is not None:
+        return orjson.loads(r.content)
+    return r.json()
+
+
+def _round_ll(lat: float, lon: float) -> Tuple[float, float]:
+    """キャッシュのキー・PKに使う緯度経度を安定した精度に丸める"""
+    return round(lat, _CACHE_NDIGITS), round(lon, _CACHE_NDIGITS)
+
+
+def _normalize_place(place: str) -> str:
+    """geocode_cacheのキーとして使う地名の正規化
+
+    NFKCで全角英数・半角カナなどの表記ゆれを畳み込んでからtrim+小文字化する。
+    「ﾄﾔﾏ」「トヤマ」のような入力が同じキャッシュ行に当たるようになる。
+    """
+    return unicodedata.normalize("NFKC", place).strip().lower()
+
+
+# DDL・ANALYZE・先読みは冪等なので、プロセスごとに一度だけ実行すれば十分
+_DB_READY = False
+
+
+def ensure_db():
+    global _DB_READY
+    if _DB_READY:
+        return
+    con = _get_conn()
+    cur = con.cursor()
+    # 天気（日次）
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS weather_daily (
+        date TEXT NOT NULL,
+        lat REAL NOT NULL,
+        lon REAL NOT NULL,
+        tmax_c REAL,
+        tmin_c REAL,
+        precip_mm REAL,
+        weather_code INTEGER,
+        weather_text TEXT,
+        source TEXT,
+        PRIMARY KEY(date, lat, lon)
+    );
+    """)
+    # 日の出/日の入
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS sun_info (
+        date TEXT NOT NULL,
+        lat REAL NOT NULL,
+        lon REAL NOT NULL,
+        sunrise_utc TEXT,
+        sunset_utc TEXT,
+        source TEXT,
+        PRIMARY KEY(date, lat, lon)
+    );
+    """)
+    # 日記本文（閲覧用）
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS diary_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,          -- 例: 2025-09-24
+        title TEXT,
+        body TEXT NOT NULL,
+        location TEXT,
+        tags TEXT,
+        created_at TEXT DEFAULT (datetime('now'))
+    );
+    """)
+    # ジオコーディング結果の永続キャッシュ（地名 -> 緯度経度）
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS geocode_cache (
+        address TEXT PRIMARY KEY,
+        lat REAL NOT NULL,
+        lon REAL NOT NULL,
+        resolved TEXT,
+        ts INTEGER
+    );
+    """)
+    # キーワード検索用のFTS5外部コンテンツ表（trigramで日本語の部分一致に対応）。
+    # 外部コンテンツ表への素のSELECTはdiary_entries側を読んでしまい
+    # インデックスの有無を判定できないため、作成前にsqlite_masterで確認する
+    fts_existed = cur.execute(
+        "SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type='table' AND name='diary_fts')"
+    ).fetchone()[0]
+    cur.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS diary_fts USING fts5(
+        title, body, location, tags,
+        content='diary_entries', content_rowid='id',
+        tokenize='trigram'
+    );
+    """)
+    # ORDER BY date DESC, id DESC LIMIT 200 を全表ソートなしで処理するための複合インデックス
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_diary_date_id ON diary_entries(date DESC, id DESC);
+    """)
+    # プランナが新しいインデックスを選べるよう統計を更新する
+    cur.execute("ANALYZE;")
+    # diary_entriesの変更をFTSへ反映するトリガ
+    cur.executescript("""
+    CREATE TRIGGER IF NOT EXISTS diary_fts_ai AFTER INSERT ON diary_entries BEGIN
+        INSERT INTO diary_fts(rowid, title, body, location, tags)
+        VALUES (new.id, new.title, new.body, new.location, new.tags);
+    END;
+    CREATE TRIGGER IF NOT EXISTS diary_fts_ad AFTER DELETE ON diary_entries BEGIN
+        INSERT INTO diary_fts(diary_fts, rowid, title, body, location, tags)
+        VALUES ('delete', old.id, old.title, old.body, old.location, old.tags);
+    END;
+    CREATE TRIGGER IF NOT EXISTS diary_fts_au AFTER UPDATE ON diary_entries BEGIN
+        INSERT INTO diary_fts(diary_fts, rowid, title, body, location, tags)
+        VALUES ('delete', old.id, old.title, old.body, old.location, old.tags);
+        INSERT INTO diary_fts(rowid, title, body, location, tags)
+        VALUES (new.id, new.title, new.body, new.location, new.tags);
+    END;
+    """)
+    # 既存DBへの移行: FTS表の作成前からある行はトリガの対象外のため、
+    # この実行で表を作った場合は既存行からインデックスを再構築する
+    if not fts_existed:
+        cur.execute("INSERT INTO diary_fts(diary_fts) VALUES('rebuild');")
+    _preload_geocode_cache()
+    _DB_READY = True
+
+
+def _preload_geocode_cache():
+    """よく使う地名をプロセス内のdictに先読みしておく（SQLiteすら引かずに済む）"""
+    if _GEOCODE_HOT:
+        return
+    cur = _get_conn().cursor()
+    cur.execute("SELECT address, lat, lon, resolved FROM geocode_cache ORDER BY ts DESC LIMIT 256")
+    for address, lat, lon, resolved in cur.fetchall():
+        _GEOCODE_HOT[address] = (lat, lon, resolved)
+
+
+# 書き込み先の列は固定なので、SQL文字列は毎回組み立てずモジュール定数にしておく
+# （Python側の文字列結合と、SQLite側の再パースの両方を省ける）
+_SQL_WEATHER = (
+    "INSERT OR REPLACE INTO weather_daily"
+    "(date,lat,lon,tmax_c,tmin_c,precip_mm,weather_code,weather_text,source)"
+    " VALUES (?,?,?,?,?,?,?,?,?)"
+)
+_SQL_SUN = (
+    "INSERT OR REPLACE INTO sun_info(date,lat,lon,sunrise_utc,sunset_utc,source)"
+    " VALUES (?,?,?,?,?,?)"
+)
+_SQL_GEOCODE = (
+    "INSERT OR REPLACE INTO geocode_cache(address,lat,lon,resolved,ts)"
+    " VALUES (?,?,?,?,?)"
+)
+
+
+# -----------------------------
+# Geocoding (place -> lat/lon)
+# -----------------------------
+def geocode_place(place: str) -> Optional[Tuple[float, float, str]]:
+    key = _normalize_place(place)
+
+    # 1) プロセス内キャッシュ → 2) SQLiteキャッシュ → 3) HTTP の順で解決する
+    hit = _GEOCODE_HOT.get(key)
+    if hit:
+        return hit
+
+    cur = _get_conn().cursor()
+    cur.execute("SELECT lat, lon, resolved FROM geocode_cache WHERE address = ?", (key,))
+    row = cur.fetchone()
+    if row:
+        _GEOCODE_HOT[key] = (row[0], row[1], row[2])
+        return row[0], row[1], row[2]
+
+    r = retry_get(
+        "https://geocoding-api.open-meteo.com/v1/search",
+        {"name": place, "count": 1, "language": "ja", "format": "json"}
+    )
+    if not r:
+        return None
+    data = _parse_json(r)
+    if not data.get("results"):
+        return None
+    res = data["results"][0]
+    # ジオコーダ由来の座標はここで丸めておき、下流のPK・キャッシュキーを安定させる
+    lat, lon = _round_ll(float(res["latitude"]), float(res["longitude"]))
+    name = res.get("name") or place
+    admin1 = res.get("admin1") or ""
+    country = res.get("country") or ""
+    resolved = " ".join([x for x in [name, admin1, country] if x])
+
+    _get_conn().execute(_SQL_GEOCODE, (key, lat, lon, resolved, int(time.time())))
+    _GEOCODE_HOT[key] = (lat, lon, resolved)
+    return lat, lon, resolved
+
+
+# -----------------------------
+# Historical Weather (daily)
+# -----------------------------
+WEATHER_CODE_MAP = {
+    0: "快晴", 1: "晴れ", 2: "薄曇り", 3: "曇り",
+    45: "霧", 48: "霧氷", 51: "霧雨（弱）", 53: "霧雨（中）", 55: "霧雨（強）",
+    61: "雨（弱）", 63: "雨（中）", 65: "雨（強）",
+    71: "雪（弱）", 73: "雪（中）", 75: "雪（強）",
+    95: "雷雨（弱）", 96: "雷雨（雹あり弱）", 99: "雷雨（雹あり強）",
+}
+
+# 天気コードは0〜99の小さい整数なので、dictのハッシュ引きではなくタプルの添字アクセスで引く
+_WEATHER_TEXT = tuple(WEATHER_CODE_MAP.get(i, f"天気コード{i}") for i in range(100))
+
+
+def _cached_weather(date_str: str, lat: float, lon: float) -> Optional[Dict]:
+    cur = _get_conn().cursor()
+    cur.execute(
+        "SELECT tmax_c, tmin_c, precip_mm, weather_code, weather_text, source "
+        "FROM weather_daily WHERE date = ? AND lat = ? AND lon = ?",
+        (date_str, lat, lon),
+    )
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {
+        "tmax_c": row[0], "tmin_c": row[1], "precip_mm": row[2],
+        "weather_code": row[3], "weather_text": row[4], "source": row[5],
+    }
+
+
+def fetch_daily_weather(date_str: str, lat: float, lon: float, refresh: bool = False) -> Optional[Dict]:
+    lat, lon = _round_ll(lat, lon)
+
+    # キャッシュ済みならHTTPを叩かない（refresh指定時は強制再取得）
+    if not refresh:
+        cached = _cached_weather(date_str, lat, lon)
+        if cached:
+            return cached
+
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "start_date": date_str,
+        "end_date": date_str,
+        "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,weathercode",
+        "timezone": "UTC",
+    }
+    r = retry_get("https://api.open-meteo.com/v1/forecast", params)
+    if not r:
+        return None
+    js = _parse_json(r)
+    daily = js.get("daily")
+    if not daily:
+        return None
+    try:
+        tmax = daily["temperature_2m_max"][0]
+        tmin = daily["temperature_2m_min"][0]
+        precip = daily["precipitation_sum"][0]
+        code = int(daily["weathercode"][0])
+        text = _WEATHER_TEXT[code] if 0 <= code < 100 else f"天気コード{code}"
+        return {
+            "tmax_c": tmax,
+            "tmin_c": tmin,
+            "precip_mm": precip,
+            "weather_code": code,
+            "weather_text": text,
+            "source": "open-meteo",
+        }
+    except Exception:
+        return None
+
+
+def fetch_daily_weather_range(start_date: str, end_date: str, lat: float, lon: float) -> list:
+    """日付範囲の天気を1回のAPI呼び出しで取得し、まとめてSQLiteへ書き込む。
+
+    N日分を日ごとのfetch_daily_weatherで取るとHTTP往復がN回になるが、
+    Open-Meteoは日付範囲リクエストに対応しているので1往復で済む。
+    パースも1回で、N行をexecutemanyで1トランザクションに書き込む。
+    返り値は日付順の record dict（fetch_daily_weatherと同じ形＋"date"キー）のリスト。
+    """
+    ensure_db()
+    lat, lon = _round_ll(lat, lon)
+
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "start_date": start_date,
+        "end_date": end_date,
+        "daily": "temperature_2m_max,temperature_2m_min,precipitation_sum,weathercode",
+        "timezone": "UTC",
+    }
+    r = retry_get("https://api.open-meteo.com/v1/forecast", params)
+    if not r:
+        return []
+    js = _parse_json(r)
+    daily = js.get("daily")
+    if not daily:
+        return []
+
+    records = []
+    rows = []
+    try:
+        for date_str, tmax, tmin, precip, code in zip(
+            daily["time"],
+            daily["temperature_2m_max"],
+            daily["temperature_2m_min"],
+            daily["precipitation_sum"],
+            daily["weathercode"],
+        ):
+            code = int(code)
+            text = _WEATHER_TEXT[code] if 0 <= code < 100 else f"天気コード{code}"
+            records.append({
+                "date": date_str,
+                "tmax_c": tmax,
+                "tmin_c": tmin,
+                "precip_mm": precip,
+                "weather_code": code,
+                "weather_text": text,
+                "source": "open-meteo",
+            })
+            rows.append((date_str, lat, lon, tmax, tmin, precip, code, text, "open-meteo"))
+    except Exception:
+        return []
+
+    # 接続はautocommit（isolation_level=None）なので、`with con:` では
+    # トランザクションにならない。明示的にBEGIN/COMMITで1回のfsyncにまとめる
+    con = _get_conn()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        con.executemany(_SQL_WEATHER, rows)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    return records
+
+
+# -----------------------------
+# Sunrise / Sunset
+# -----------------------------
+def _cached_sun(date_str: str, lat: float, lon: float) -> Optional[Dict]:
+    cur = _get_conn().cursor()
+    cur.execute(
+        "SELECT sunrise_utc, sunset_utc, source FROM sun_info WHERE date = ? AND lat = ? AND lon = ?",
+        (date_str, lat, lon),
+    )
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {"sunrise_utc": row[0], "sunset_utc": row[1], "source": row[2]}
+
+
+def fetch_sunrise_sunset(date_str: str, lat: float, lon: float, refresh: bool = False) -> Optional[Dict]:
+    lat, lon = _round_ll(lat, lon)
+
+    if not refresh:
+        cached = _cached_sun(date_str, lat, lon)
+        if cached:
+            return cached
+
+    r = retry_get(
+        "https://api.sunrise-sunset.org/json",
+        {"lat": lat, "lng": lon, "date": date_str, "formatted": 0}
+    )
+    if not r:
+        return None
+    js = _parse_json(r)
+    if js.get("status") != "OK":
+        return None
+    res = js.get("results", {})
+    return {
+        "sunrise_utc": res.get("sunrise"),
+        "sunset_utc": res.get("sunset"),
+        "source": "sunrise-sunset.org"
+    }
+
+
+# -----------------------------
+# Normalize & Persist
+# -----------------------------
+def enrich_and_store(date_str: str, lat: float, lon: float, refresh: bool = False) -> Dict:
+    ensure_db()
+    # キャッシュ・PKは丸めた座標でキーし、返却レコードには元の座標を残す
+    raw_lat, raw_lon = lat, lon
+    lat, lon = _round_ll(lat, lon)
+
+    # 天気と日の出入は独立したREST呼び出しなので並列に投げる
+    # （どちらも数百msかかるため、逐次実行だと合計がそのままレイテンシになる）
+    fw = _PAIR_EXECUTOR.submit(fetch_daily_weather, date_str, lat, lon, refresh)
+    fs = _PAIR_EXECUTOR.submit(fetch_sunrise_sunset, date_str, lat, lon, refresh)
+    weather = fw.result()
+    sun = fs.result()
+
+    # 天気と日の出入を1トランザクションでまとめて書き込む（fsyncを1回にする）
+    con = _get_conn()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        if weather:
+            con.execute(_SQL_WEATHER, (
+                date_str, lat, lon,
+                weather["tmax_c"], weather["tmin_c"], weather["precip_mm"],
+                weather["weather_code"], weather["weather_text"], weather["source"],
+            ))
+        if sun:
+            con.execute(_SQL_SUN, (
+                date_str, lat, lon,
+                sun["sunrise_utc"], sun["sunset_utc"], sun["source"],
+            ))
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+
+    return {
+        "date": date_str,
+        "location": {"lat": raw_lat, "lon": raw_lon},
+        "weather": weather,
+        "sun": sun
+    }
+
+
+def enrich_and_store_many(date_latlons):
+    """複数の (date_str, lat, lon) をスレッドプールで並列にenrichする。
+
+    バッチ投入時のボトルネックはHTTPのRTTなので、日付ごとの逐次実行ではなく
+    常駐の_MANY_EXECUTOR（8ワーカー）で並列にフェッチする。
+    HTTPアダプタのプール（32接続）はワーカー数 × 2（天気＋日の出入）を
+    収容できるサイズにしてある。
+    """
+    ensure_db()
+    # スレッドに投げる前に日付形式をまとめて検証する
+    # （正規表現の一致チェックのみ。datetime構築より1桁速い）
+    bad = [d for d, _lat, _lon in date_latlons if not _DATE_RE.match(d)]
+    if bad:
+        raise ValueError(f"Invalid date(s), expected YYYY-MM-DD: {bad}")
+    futures = [_MANY_EXECUTOR.submit(enrich_and_store, d, lat, lon) for d, lat, lon in date_latlons]
+    return [f.result() for f in futures]
+
+
+# -----------------------------
+# Diary read helpers
+# -----------------------------
+def _build_diary_sql(has_from: bool, has_to: bool, kw_mode: str) -> str:
+    """query_diaries用のSQLを組み立てる。kw_mode: '' / 'fts' / 'like'"""
+    if kw_mode == "fts":
+        q = ("SELECT d.id, d.date, d.title, d.body, d.location, d.tags, d.created_at "
+             "FROM diary_entries AS d JOIN diary_fts ON diary_fts.rowid = d.id "
+             "WHERE diary_fts MATCH ?")
+    else:
+        q = ("SELECT id, date, title, body, location, tags, created_at "
+             "FROM diary_entries AS d WHERE 1=1")
+        if kw_mode == "like":
+            q += " AND (title LIKE ? OR body LIKE ? OR location LIKE ? OR tags LIKE ?)"
+    if has_from:
+        q += " AND d.date >= ?"
+    if has_to:
+        q += " AND d.date <= ?"
+    return q + " ORDER BY d.date DESC, d.id DESC LIMIT 200"
+
+
+# クエリ文字列は毎回組み立てず、(from, to, キーワード種別) の全組み合わせを事前生成しておく
+_SQL_VARIANTS = {
+    (has_from, has_to, kw_mode): _build_diary_sql(has_from, has_to, kw_mode)
+    for has_from in (False, True)
+    for has_to in (False, True)
+    for kw_mode in ("", "fts", "like")
+}
+
+
+def query_diaries(date_from: Optional[str] = None,
+                  date_to: Optional[str] = None,
+                  keyword: str = ""):
+    cur = _get_conn().cursor()
+    # 共有接続のrow_factoryを汚さないよう、カーソル側にだけ設定する
+    cur.row_factory = sqlite3.Row
+
+    keyword = keyword.strip()
+    params = []
+    if keyword:
+        # trigramトークナイザは3文字未満の語を引けないので、その場合だけLIKEに落とす
+        if len(keyword) >= 3:
+            kw_mode = "fts"
+            params.append('"%s"' % keyword.replace('"', '""'))
+        else:
+            kw_mode = "like"
+            like = f"%{keyword}%"
+            params += [like, like, like, like]
+    else:
+        kw_mode = ""
+    if date_from:
+        params.append(date_from)
+    if date_to:
+        params.append(date_to)
+
+    cur.execute(_SQL_VARIANTS[(bool(date_from), bool(date_to), kw_mode)], params)
+    return cur.fetchall()
+
+
+def seed_demo_entries():
+    """デモ確認用の初期データ。必要なときだけ呼び出してください。"""
+    con = _get_conn()
+    cur = con.cursor()
+    cur.execute("SELECT COUNT(*) FROM diary_entries;")
+    n = cur.fetchone()[0]
+    if n == 0:
+        rows = [
+            ("2025-09-22", "日曜の散歩", "午前中に近所をぶらぶら歩いた。カフェで読書。", "富山市", "散歩,読書"),
+            ("2025-09-23", "雨で在宅", "一日雨。家で掃除と料理。夜は映画を観た。", "富山市", "在宅,雨,映画"),
+            ("2025-09-24", "研究の日", "大学で実験。夕方に友人とラーメン。", "富山市", "研究,食事")
+        ]
+        cur.executemany(
+            "INSERT INTO diary_entries(date,title,body,location,tags) VALUES (?,?,?,?,?)", rows
+        )
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def parse_args():
+    p = argparse.ArgumentParser(description="Diary interpolation: free-API ingestion")
+    p.add_argument("--cli", action="store_true", help="CLIモードで実行（UIは無効）")
+    p.add_argument("--date", help="YYYY-MM-DD")
+    p.add_argument("--place", help="地名（例: 富山市）")
+    p.add_argument("--lat", type=float, help="緯度")
+    p.add_argument("--lon", type=float, help="経度")
+    p.add_argument("--refresh", action="store_true", help="SQLiteキャッシュを無視してAPIから再取得する")
+    return p.parse_args()
+
+
+def run_cli(args):
+    # date validation
+    if not args.date:
+        raise SystemExit("ERROR: --date を指定してください。")
+    # 正規表現で形式を先に弾き、暦として妥当かだけfromisoformatで確認する
+    if not _DATE_RE.match(args.date):
+        raise SystemExit("ERROR: --date は YYYY-MM-DD 形式で指定してください。")
+    try:
+        _ = dt.date.fromisoformat(args.date)
+    except ValueError:
+        raise SystemExit("ERROR: --date は YYYY-MM-DD 形式で指定してください。")
+
+    ensure_db()
+
+    # resolve location
+    if args.place:
+        geo = geocode_place(args.place)
+        if not geo:
+            raise SystemExit("ERROR: 地名を緯度経度に解決できませんでした。別の表記を試してください。")
+        lat, lon, resolved = geo
+        print(f"[INFO] Resolved place: {resolved} -> lat={lat}, lon={lon}")
+    else:
+        if args.lat is None or args.lon is None:
+            raise SystemExit("ERROR: --place か --lat/--lon のいずれかを指定してください。")
+        lat, lon = _round_ll(args.lat, args.lon)
+        print(f"[INFO] Using coordinates: lat={lat}, lon={lon}")
+
+    record = enrich_and_store(args.date, lat, lon, refresh=args.refresh)
+    print(dumps(record))
+
+
+# -----------------------------
+# UI (Streamlit)
+# -----------------------------
+def render_ui():
+    import streamlit as st
+
+    st.set_page_config(page_title="日記の補間 - データ取得/閲覧", page_icon="📒", layout="centered")
+    st.title("📒 日記の補間（PoC）")
+
+    ensure_db()
+
+    # Streamlitはウィジェット操作のたびにスクリプト全体を再実行するため、
+    # DBプレビューと日記一覧は短いTTLでキャッシュして再実行コストをゼロに近づける
+    @st.cache_data(ttl=30)
+    def _recent_weather():
+        cur = _get_conn().cursor()
+        cur.execute("SELECT * FROM weather_daily ORDER BY date DESC LIMIT 10;")
+        cols = [d[0] for d in cur.description]
+        return cols, cur.fetchall()
+
+    @st.cache_data(ttl=30)
+    def _cached_diaries(date_from, date_to, kw):
+        # sqlite3.Rowはpickleできないのでdictに変換してキャッシュする
+        return [dict(r) for r in query_diaries(date_from, date_to, kw)]
+    # デモ確認のときだけ有効化
+    # seed_demo_entries()
+
+    tab_fetch, tab_view = st.tabs(["🛠 データ取得", "📗 日記を見る"])
+
+    # ------------ データ取得タブ ------------
+    with tab_fetch:
+        with st.form("fetch_form", clear_on_submit=False):
+            d = st.date_input("日付", value=dt.date.today())
+            place = st.text_input("場所（市区町村名／ランドマーク名）", value="富山市")
+            lat = st.text_input("緯度（未入力なら地名を使用）", value="")
+            lon = st.text_input("経度（未入力なら地名を使用）", value="")
+            submitted = st.form_submit_button("取得して保存する")
+
+        if submitted:
+            date_str = d.isoformat()
+
+            # resolve location
+            lat_f = lon_f = None
+            if lat.strip() and lon.strip():
+                try:
+                    lat_f = float(lat); lon_f = float(lon)
+                except ValueError:
+                    st.error("緯度・経度は数値で入力してください。")
+                    st.stop()
+            else:
+                geo = geocode_place(place)
+                if not geo:
+                    st.error("地名を緯度経度に解決できませんでした。別の表記を試してください。")
+                    st.stop()
+                lat_f, lon_f, resolved = geo
+                st.info(f"解決: {resolved} → lat={lat_f}, lon={lon_f}")
+
+            with st.spinner("取得中…"):
+                rec = enrich_and_store(date_str, lat_f, lon_f)
+
+            st.success(f"取得・保存しました（{DB_PATH}）")
+            st.code(dumps(rec), language="json")
+
+        if st.checkbox("DBの中身を少し見る（weather_daily 先頭10件）"):
+            import pandas as pd  # オプション表示でのみ使用
+            cols, rows = _recent_weather()
+            # from_recordsは型推論付きのread_sql_queryより軽い
+            st.dataframe(pd.DataFrame.from_records(rows, columns=cols))
+
+    # ------------ 日記閲覧タブ ------------
+    with tab_view:
+        st.subheader("日記一覧（閲覧用）")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            df = st.date_input("開始日", value=None)
+        with col2:
+            dt_ = st.date_input("終了日", value=None)
+
+        kw = st.text_input("キーワード（タイトル/本文/場所/タグから検索）", placeholder="例: 研究, 雨, ランニング")
+
+        # フィルタ実行
+        date_from = df.isoformat() if df else None
+        date_to = dt_.isoformat() if dt_ else None
+        rows = _cached_diaries(date_from, date_to, kw)
+
+        if not rows:
+            st.info("条件に合う日記がありません。フィルタを変更してください。")
+        else:
+            for r in rows:
+                with st.expander(f"{r['date']}  —  {r['title'] or '(無題)'}  [{r['location'] or '-'}]"):
+                    st.markdown(f"**タグ**: {r['tags'] or '-'}")
+                    st.markdown("---")
+                    st.markdown(r["body"])
+                    st.caption(f"ID: {r['id']} / 作成: {r['created_at']}")
+
+            # 一覧CSVエクスポート
+            if st.button("この一覧をCSVダウンロード"):
+                import pandas as pd, io  # オプション時のみ
+                df_csv = pd.DataFrame([dict(row) for row in rows])
+                csv = df_csv.to_csv(index=False)
+                st.download_button("CSVを保存", data=csv, file_name="diaries.csv", mime="text/csv")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.cli:
+        run_cli(args)
+    else:
+        render_ui()
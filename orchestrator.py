@@ -14,25 +14,30 @@ class Orchestrator:
             return InterpolationResponse(
                 date=req.date,
                 text=f"Error during retrieval: {e}",
-                citations=[]
+                citations=[],
+                fallback=True,
             )
 
         # 2. RAG Chainでプロンプトを組み立て、LLMで生成
         context = build_context(passages)
-        text = generate_interpolation(req.date, context, req.hint)
+        text, fallback_used = generate_interpolation(req.date, context, req.hint)
 
         # 3. レスポンスを構築
-        citations = []
-        for passage in passages:
-            metadata = passage.get("metadata", {}) if isinstance(passage, dict) else {}
-            snippet = passage.get("text", "")[:100] + "..." if isinstance(passage, dict) else ""
-            citation_date = metadata.get("date", req.date)
-            citations.append(Citation(snippet=snippet, date=citation_date))
+        # retriever.searchは常に {"text", "metadata", "score"} のdictを返すため、
+        # 要素ごとのisinstance分岐は不要。1パスの内包表記で組み立てる
+        citations = [
+            Citation(
+                snippet=p["text"][:100] + "...",
+                date=p["metadata"].get("date") or req.date,
+            )
+            for p in passages
+        ]
 
         return InterpolationResponse(
             date=req.date,
             text=text,
             citations=citations,
+            fallback=fallback_used,
         )
 
 orchestrator_instance = Orchestrator()
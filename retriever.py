@@ -1,11 +1,24 @@
 import torch
 from pinecone import Pinecone
 import datetime  # 'date'クラスとの名前衝突を避けるため、モジュール全体をインポート
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Dict
-from sentence_transformers import SentenceTransformer
 
-# プロジェクト共通の設定をインポート
+# プロジェクト共通の設定とモデルローダをインポート
 import config
+import embeddings
+
+
+@lru_cache(maxsize=4096)
+def _ts_to_date_str(ts_int: int) -> str:
+    """Unixタイムスタンプ（秒）を YYYY-MM-DD に変換する。
+
+    検索結果のマッチごとにdatetime構築＋strftimeのフォーマット解析を
+    繰り返さないよう、整数秒をキーにキャッシュする。
+    """
+    return datetime.date.fromtimestamp(ts_int).isoformat()
+
 
 class Retriever:
     """
@@ -17,24 +30,30 @@ class Retriever:
         """
         self.embedding_model = self._load_embedding_model()
         self.embedding_dim = self._get_embedding_dimension()
+        # クエリが空のときに使うゼロベクトルは毎回作らず1本を使い回す
+        # （Pinecone側でシリアライズされるだけなので防御的コピーは不要）
+        self._zero_vector = [0.0] * self.embedding_dim
         self.pinecone_index = self._connect_to_pinecone()
 
     def _load_embedding_model(self):
         try:
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            print(f"Retriever: Using device '{device}' for embedding model.")
-            return SentenceTransformer(config.EMBEDDING_MODEL_NAME, device=device)
+            # バックエンドの選択はembeddings.load_embedding_modelに集約:
+            # CPUではint8量子化のCTranslate2版（入っていれば）、
+            # CUDAではfp16のSentenceTransformerがロードされる
+            return embeddings.load_embedding_model()
         except Exception as e:
-            print(f"Error loading SentenceTransformer model: {e}")
+            print(f"Error loading embedding model: {e}")
             return None
 
     def _get_embedding_dimension(self) -> int:
         """ロードしたモデルから埋め込みベクトルの次元数を取得する"""
         if self.embedding_model:
-            return self.embedding_model.get_sentence_embedding_dimension()
+            getter = getattr(self.embedding_model, "get_sentence_embedding_dimension", None)
+            # CTranslate2版エンコーダは次元取得APIを持たないため設定値を使う
+            return getter() if getter else config.EMBEDDING_DIMENSION
         # モデルのロードに失敗した場合のフォールバック
         print("Warning: Embedding model not loaded. Using fallback dimension.")
-        return 768
+        return config.EMBEDDING_DIMENSION
 
     def _connect_to_pinecone(self):
         try:
@@ -52,7 +71,53 @@ class Retriever:
         if not self.pinecone_index or not self.embedding_model:
             raise ConnectionError("Retriever is not properly initialized.")
 
-        # 1. ターゲット日付の周辺をメタデータフィルタで検索
+        # 検索用のベクトルを生成（inference_modeでautogradの記録を止める）。
+        # normalize_embeddings=Trueでエンコーダ側で正規化まで済ませ、
+        # Python floatへの変換（tolist）は最後に1回だけ行う
+        if query:
+            with torch.inference_mode():
+                vector = self.embedding_model.encode(
+                    query,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False,
+                ).tolist()
+        else:
+            # クエリが空の場合は事前に確保したゼロベクトルを使用
+            vector = self._zero_vector
+
+        return self._search_with_vector(date, vector, k, day_window)
+
+    def search_batch(self, items: List[tuple], k: int = 6, day_window: int = 3) -> List[List[Dict]]:
+        """複数の (date, query) をまとめて検索する。
+
+        クエリの埋め込みは1回のencode呼び出しにバッチし（GPUのカーネル起動
+        コストを償却）、Pineconeへの問い合わせはスレッドプールで並列に投げて
+        ネットワーク往復を重ねる。返り値はitemsと同じ順序の結果リスト。
+        """
+        if not self.pinecone_index or not self.embedding_model:
+            raise ConnectionError("Retriever is not properly initialized.")
+
+        queries = [q for _, q in items if q]
+        if queries:
+            with torch.inference_mode():
+                encoded = self.embedding_model.encode(
+                    queries, batch_size=32, convert_to_numpy=True, show_progress_bar=False
+                )
+            encoded_iter = iter(encoded)
+            vectors = [next(encoded_iter).tolist() if q else self._zero_vector for _, q in items]
+        else:
+            vectors = [self._zero_vector] * len(items)
+
+        with ThreadPoolExecutor(max_workers=min(8, max(1, len(items)))) as ex:
+            futures = [
+                ex.submit(self._search_with_vector, date, vector, k, day_window)
+                for (date, _), vector in zip(items, vectors)
+            ]
+            return [f.result() for f in futures]
+
+    def _search_with_vector(self, date: str, vector: List[float], k: int, day_window: int) -> List[Dict]:
+        # 1. ターゲット日付の周辺ウィンドウをタイムスタンプで計算する
         target_date = datetime.date.fromisoformat(date)
         start_date_obj = (target_date - datetime.timedelta(days=day_window))
         end_date_obj = (target_date + datetime.timedelta(days=day_window))
@@ -61,44 +126,27 @@ class Retriever:
         start_timestamp = int(datetime.datetime.combine(start_date_obj, datetime.time.min).timestamp())
         end_timestamp = int(datetime.datetime.combine(end_date_obj, datetime.time.min).timestamp())
 
-        filter_dict = {
-            "date": {
-                "$gte": start_timestamp,
-                "$lte": end_timestamp
-            }
-        }
-
-        # 検索用のベクトルを生成
-        if query:
-            vector = self.embedding_model.encode(query).tolist()
-        else:
-            # クエリが空の場合はゼロベクトルを使用（モデルから取得した次元数）
-            vector = [0.0] * self.embedding_dim
-
         try:
-            # Pineconeにクエリ実行
+            # 2. フィルタなしで多めに1回だけクエリし、ウィンドウ内/外の振り分けは
+            # クライアント側で行う（従来の2段クエリはRTTが2倍かかっていた）
             results = self.pinecone_index.query(
                 vector=vector,
-                filter=filter_dict,
-                top_k=k,
+                top_k=k * 3,
                 include_metadata=True
             )
 
-            # 2. 結果が不足している場合、日付フィルタなしで全体から類似度が高いものを追加で検索
-            found_ids = {match['id'] for match in results['matches']}
-            if len(results['matches']) < k:
-                broader_results = self.pinecone_index.query(
-                    vector=vector,
-                    top_k=k * 2, # 多めに取得してフィルタリング
-                    include_metadata=True
-                )
-                
-                for match in broader_results['matches']:
-                    if match['id'] not in found_ids:
-                        results['matches'].append(match)
-                        found_ids.add(match['id'])
-                        if len(results['matches']) >= k:
-                            break
+            in_window = []
+            out_of_window = []
+            for match in results['matches']:
+                ts = match['metadata'].get('date')
+                try:
+                    in_range = start_timestamp <= float(ts) <= end_timestamp
+                except (ValueError, TypeError):
+                    in_range = False
+                (in_window if in_range else out_of_window).append(match)
+
+            # ウィンドウ内を優先し、足りない分を全体の類似上位で埋める
+            matches = in_window[:k] + out_of_window[: max(0, k - len(in_window))]
 
         except Exception as e:
             print(f"ERROR: An exception occurred during Pinecone query: {e}")
@@ -106,14 +154,14 @@ class Retriever:
 
         # 3. 返却形式を整形
         passages = []
-        for match in results['matches']:
+        for match in matches:
             ts = match['metadata'].get('date')
             date_str = ''
             # ▼▼▼【修正点】タイムスタンプが文字列で返されることがあるため、数値に変換する▼▼▼
             if ts:
                 try:
-                    # Pineconeは数値を文字列として返すことがあるため、floatに変換
-                    date_str = datetime.datetime.fromtimestamp(float(ts)).strftime('%Y-%m-%d')
+                    # Pineconeは数値を文字列として返すことがあるため、floatを経由して整数秒に正規化
+                    date_str = _ts_to_date_str(int(float(ts)))
                 except (ValueError, TypeError):
                     # 変換に失敗した場合のフォールバック
                     date_str = match.get('id', '') # ID（日付文字列）をそのまま使う
@@ -31,6 +31,8 @@ class InterpolationResponse(BaseModel):
     date: str
     text: str
     citations: List[Citation]
+    # LLM失敗時などの代替出力かどうか（Trueの応答は永続キャッシュに載せない）
+    fallback: bool = False
 
 class IngestRequest(BaseModel):
     """
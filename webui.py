@@ -6,17 +6,32 @@
 # - 通信失敗時は自動リトライ & トースト表示。最終的にモックでローカル動作を保証
 
 import os
+import hashlib
 import json
 import textwrap
+import time
 import datetime as dt
 import difflib
-from html import escape
+from concurrent.futures import ThreadPoolExecutor
 
 import streamlit as st
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+# difflib.HtmlDiffは入力が長くなると極端に遅いため、
+# diff-match-patchが入っていればそちらを使う（桁違いに速く、HTMLも小さい）
+try:
+    from diff_match_patch import diff_match_patch
+except ImportError:  # pragma: no cover - ランタイム環境による
+    diff_match_patch = None
+
+# JSONのエンコードはorjsonがあればC実装に任せる
+try:
+    import orjson
+except ImportError:  # pragma: no cover - ランタイム環境による
+    orjson = None
+
 from orchestrator import orchestrator_instance
 from schemas import InterpolationRequest
 
@@ -31,9 +46,22 @@ INGEST_ENDPOINT       = f"{API_BASE}/ingest"               # POST (fallback)
 
 PAGE_TITLE = "日記補間：承認フロー"
 
+# モック補間稿のテンプレート。dedentはimport時に一度だけ実行し、
+# 成功パス（補間が通った場合）では文字列を一切組み立てない
+_MOCK_TMPL = textwrap.dedent("""\
+    {date_iso} の出来事（自動補間）
+    - 朝：曇りがち。通学路は静か。
+    - 昼：研究を進め、結果を整理。
+    - 夕：運動のあと読書でリフレッシュ。
+    ※ ヒント: {hint}""")
+
 # =========================
 # HTTP クライアント（リトライ設定）
 # =========================
+# Streamlitはウィジェット操作のたびにスクリプトを再実行するため、
+# cache_resourceでプロセスに1本のセッションを保持し、
+# 再実行ごとのTCP/TLSハンドシェイクとプール再構築を避ける
+@st.cache_resource
 def make_session() -> requests.Session:
     s = requests.Session()
     retry = Retry(
@@ -42,9 +70,12 @@ def make_session() -> requests.Session:
         status_forcelist=(429, 500, 502, 503, 504),
         allowed_methods=frozenset(["GET", "POST", "PUT", "PATCH"])
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    # keep-aliveの接続を使い回すため、プールサイズを明示する
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
     s.mount("http://", adapter)
     s.mount("https://", adapter)
+    # ボディはdata=（エンコード済みbytes）で送るため、Content-Typeを固定する
+    s.headers.update({"Content-Type": "application/json"})
     return s
 
 SESSION = make_session()
@@ -52,31 +83,116 @@ SESSION = make_session()
 # =========================
 # ユーティリティ
 # =========================
-def to_iso(d: dt.date) -> str:
-    return d.isoformat()
-
-def html_diff(a: str, b: str) -> str:
-    """原文(a)と補間稿(b)の差分をサイドバイサイドで返す（HTML）"""
-    diff = difflib.HtmlDiff(wrapcolumn=80)
-    # HtmlDiffは内部でエスケープ処理されるが、意図しないタグを避けるため pre-escape
-    a = escape(a or "")
-    b = escape(b or "")
-    html = diff.make_table(a.splitlines(), b.splitlines(),
-                           fromdesc="原文", todesc="補間稿",
-                           context=True, numlines=2)
-    # 余白調整の軽いスタイル
-    style = """
-    <style>
-      table.diff { font-family: ui-monospace, SFMono-Regular, Menlo, Consolas, monospace; font-size: 12px; }
-      .diff_header { background: #f3f4f6; }
-      .diff_next { background: #fff; }
-      .diff_add { background: #ecfdf5; }
-      .diff_chg { background: #fff7ed; }
-      .diff_sub { background: #fee2e2; }
-      td, th { padding: 4px 8px; }
-    </style>
+def _json_bytes(obj) -> bytes:
+    """リクエストボディ用のJSONエンコード（orjsonがあれば3〜10倍速い）"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode()
+
+# 余白調整の軽いスタイル（モジュール定数として1度だけ構築する）
+_DIFF_STYLE = """
+<style>
+  table.diff { font-family: ui-monospace, SFMono-Regular, Menlo, Consolas, monospace; font-size: 12px; }
+  .diff_header { background: #f3f4f6; }
+  .diff_next { background: #fff; }
+  .diff_add { background: #ecfdf5; }
+  .diff_chg { background: #fff7ed; }
+  .diff_sub { background: #fee2e2; }
+  td, th { padding: 4px 8px; }
+</style>
+"""
+
+
+# これを超える行数の差分は既定で切り詰める（ブラウザに送るDOMサイズの上限）
+_DIFF_MAX_LINES = 400
+
+# HTMLエスケープ用の変換表。html.escapeはreplaceを文字ごとに重ねるが、
+# str.translateなら長文でもC実装の1パスで済む
+_ESC = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&#x27;",
+})
+
+# フォールバック用のHtmlDiffは呼び出しごとに作らず1インスタンスを使い回す
+# （コンストラクタが内部の正規表現などを毎回組み直すため）
+_HTML_DIFF = difflib.HtmlDiff(wrapcolumn=80)
+
+
+# Streamlitの再実行ごとに同じ(a, b)の差分を計算し直さないようキャッシュする
+@st.cache_data(max_entries=64, show_spinner=False)
+def html_diff(a: str, b: str, full: bool = False) -> str:
+    """原文(a)と補間稿(b)の差分を返す（HTML、スタイルは含まない）
+
+    長大な入力では差分計算よりもHTMLのサイズがボトルネックになるため、
+    full=Falseの場合は両辺を_DIFF_MAX_LINES行に切り詰めてから比較する。
+    _DIFF_STYLEはキャッシュエントリごとに複製せず、描画側で1度だけ付ける。
     """
-    return style + html
+    a = a or ""
+    b = b or ""
+
+    truncated = False
+    if not full:
+        a_lines = a.splitlines()
+        b_lines = b.splitlines()
+        if max(len(a_lines), len(b_lines)) > _DIFF_MAX_LINES:
+            a = "\n".join(a_lines[:_DIFF_MAX_LINES])
+            b = "\n".join(b_lines[:_DIFF_MAX_LINES])
+            truncated = True
+    notice = (
+        f"<p>…（先頭{_DIFF_MAX_LINES}行のみ表示。全文は「全文差分を表示」を有効にしてください）</p>"
+        if truncated else ""
+    )
+
+    # 片側が空なら差分計算そのものが不要（成功パスではsource_textが常に空で、
+    # これが最頻のケース）。全文を追加/削除ブロックとして返す
+    if not a:
+        return f"<pre class='diff_add'>{b.translate(_ESC)}</pre>" + notice
+    if not b:
+        return f"<pre class='diff_sub'>{a.translate(_ESC)}</pre>" + notice
+
+    if diff_match_patch is not None:
+        dmp = diff_match_patch()
+        diffs = dmp.diff_main(a, b)
+        dmp.diff_cleanupSemantic(diffs)
+        # diff_prettyHtmlが内部でエスケープするため、二重エスケープはしない
+        return dmp.diff_prettyHtml(diffs) + notice
+
+    # フォールバック: difflibのサイドバイサイド表
+    # （make_tableが内部でエスケープするため、ここでも二重エスケープはしない）
+    html = _HTML_DIFF.make_table(a.splitlines(), b.splitlines(),
+                                 fromdesc="原文", todesc="補間稿",
+                                 context=True, numlines=2)
+    return html + notice
+
+# evidenceの整形JSONも再実行のたびに作り直さない
+# （整形もorjsonがあればC実装で行う。インデントは2スペースで従来表示と同等）
+@st.cache_data(max_entries=256, show_spinner=False)
+def render_evidence_json(e) -> str:
+    if orjson is not None:
+        return orjson.dumps(e, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(e, ensure_ascii=False, indent=2)
+
+
+def _evidence_pretty(e) -> str:
+    """evidence1件の整形JSONを内容ハッシュでセッションにキャッシュして返す。
+
+    同じ根拠（天気・引用など）は別の日付の結果にも繰り返し現れるため、
+    dict全体を引数ハッシュにかけるより安い8バイトの内容キーで引く。
+    """
+    eid = hashlib.blake2b(
+        json.dumps(e, sort_keys=True, ensure_ascii=False).encode(),
+        digest_size=8,
+    ).hexdigest()
+    cache = st.session_state.setdefault("_ev_cache", {})
+    pretty = cache.get(eid)
+    if pretty is None:
+        pretty = render_evidence_json(e)
+        cache[eid] = pretty
+    return pretty
+
 
 def toast(kind: str, msg: str):
     if kind == "ok":
@@ -86,8 +202,29 @@ def toast(kind: str, msg: str):
     else:
         st.toast(msg)
 
+# スレッドプールもセッションと同様に再実行のたびに作り直さず、
+# cache_resourceでプロセスに1組だけ保持する
+@st.cache_resource
+def _make_save_executor() -> ThreadPoolExecutor:
+    # フォールバックPOST用の小さなプール（保存は同時に1件で十分）
+    return ThreadPoolExecutor(max_workers=1)
+
+
+@st.cache_resource
+def _make_interpolate_executor() -> ThreadPoolExecutor:
+    # 補間（検索＋LLM）をスクリプトスレッドから外すためのプール
+    return ThreadPoolExecutor(max_workers=2)
+
+
+_SAVE_EXECUTOR = _make_save_executor()
+_INTERPOLATE_EXECUTOR = _make_interpolate_executor()
+
+# 接続2秒・読み取り5秒。リトライ込みでも保存の最悪待ち時間を抑える
+_SAVE_TIMEOUT = (2, 5)
+
+
 def approve_and_save(date_iso: str, text: str, evidence):
-    """承認して保存: /diary/{date} -> 失敗したら /ingest"""
+    """承認して保存: /diary/{date} -> 5xx/通信エラー時のみ /ingest にフォールバック"""
     body = {
         "text": text,
         "evidence": evidence,
@@ -97,18 +234,27 @@ def approve_and_save(date_iso: str, text: str, evidence):
     # 1) PUT /diary/{date}
     try:
         url = DIARY_PUT_ENDPOINT.format(date_iso=date_iso)
-        r = SESSION.put(url, json=body, timeout=10)
+        r = SESSION.put(url, data=_json_bytes(body), timeout=_SAVE_TIMEOUT)
         if r.status_code in (200, 201):
             toast("ok", "保存しました（/diary）。")
             return True, {"endpoint": url, "status": r.status_code}
-        else:
+        if r.status_code < 500:
+            # 4xxはリクエスト自体の問題なので、/ingestに投げ直しても失敗する
             toast("warn", f"/diary 保存失敗: {r.status_code} {r.text[:120]}")
+            return False, {"endpoint": url, "status": r.status_code}
+        toast("warn", f"/diary 保存失敗: {r.status_code} {r.text[:120]}")
     except Exception as e:
         toast("warn", f"/diary 通信エラー: {e}")
 
-    # 2) Fallback: POST /ingest
+    # 2) Fallback: POST /ingest（タイムアウト付きのexecutor経由で待ち時間を上限付きにする）
     try:
-        r2 = SESSION.post(INGEST_ENDPOINT, json={"date": date_iso, **body}, timeout=10)
+        future = _SAVE_EXECUTOR.submit(
+            SESSION.post,
+            INGEST_ENDPOINT,
+            data=_json_bytes({"date": date_iso, **body}),
+            timeout=_SAVE_TIMEOUT,
+        )
+        r2 = future.result(timeout=8)
         if r2.status_code in (200, 201):
             toast("ok", "保存しました（/ingest）。")
             return True, {"endpoint": INGEST_ENDPOINT, "status": r2.status_code}
@@ -119,6 +265,43 @@ def approve_and_save(date_iso: str, text: str, evidence):
         toast("warn", f"/ingest 通信エラー: {e}")
         return False, {"endpoint": INGEST_ENDPOINT, "error": str(e)}
 
+# 差分とevidenceはチェックボックスで明示的に要求されるまで計算・描画しない。
+# expanderの中身はスクリプトフローに入っているだけで毎回評価されてしまうため、
+# フラグで完全にスキップする。fragment化によりトグル操作でページ全体は再実行されない
+@st.fragment
+def _render_diff_panel(result):
+    with st.expander("🪄 差分（原文 vs 補間稿）を表示"):
+        if st.checkbox("差分を計算して表示", key="show_diff"):
+            full = st.checkbox("全文差分を表示（長い日記では重くなります）", key="show_full_diff")
+            # components.htmlはiframeを生成し、初期化だけで数百msかかるうえ
+            # ページ側と別のドキュメントになる。固定高さコンテナ＋markdownなら
+            # 同一DOMへの軽い挿入で済む（スタイルも描画時に1度だけ付ける）
+            st.markdown(_DIFF_STYLE, unsafe_allow_html=True)
+            with st.container(height=320):
+                st.markdown(
+                    html_diff(result["source_text"], result["interpolated_text"], full=full),
+                    unsafe_allow_html=True,
+                )
+
+
+@st.fragment
+def _render_evidence_panel(result):
+    with st.expander("🔎 根拠（evidence）を確認"):
+        if not st.checkbox("根拠を表示", key="show_evidence"):
+            return
+        ev = result.get("evidence") or []
+        pretty = result.get("evidence_pretty")
+        if isinstance(ev, list):
+            if pretty is None:
+                pretty = [_evidence_pretty(e) for e in ev]
+            for i, (e, e_json) in enumerate(zip(ev, pretty), start=1):
+                st.markdown(f"**[{i}] {e.get('type', 'info')}** — {e.get('summary','')}")
+                with st.popover(f"詳細を見る #{i}"):
+                    st.code(e_json, language="json")
+        else:
+            st.code(pretty[0] if pretty else _evidence_pretty(ev), language="json")
+
+
 # =========================
 # UI
 # =========================
@@ -131,83 +314,112 @@ with st.sidebar:
     st.text_input("API_BASE", API_BASE, key="api_base_help", help="環境変数 API_BASE で上書き可能。")
     st.caption("通信は自動リトライ。失敗時はモックで動作。")
 
-# 入力欄
-col0, col1 = st.columns([1, 2])
-with col0:
-    date_val = st.date_input("対象日付", value=dt.date.today())
-with col1:
-    hint_val = st.text_area("ヒント（任意）", placeholder="例：場所・出来事・気分などのメモ")
+# 入力欄＋補間アクション
+# formでまとめると、日付変更やヒント入力のたびのスクリプト再実行がなくなり、
+# 送信ボタンを押した1回だけ再実行される
+with st.form("interp_form"):
+    col0, col1 = st.columns([1, 2])
+    with col0:
+        date_val = st.date_input("対象日付", value=dt.date.today())
+    with col1:
+        hint_val = st.text_area("ヒント（任意）", placeholder="例：場所・出来事・気分などのメモ")
+    _do_interpolate = st.form_submit_button("🔮 補間する", use_container_width=True)
+
+# モック結果の組み立ては失敗のたびに繰り返さない（同一入力・同一エラーなら使い回す）。
+# スクリプト本体のlru_cacheは再実行のたびに関数ごと作り直されて効かないため、
+# 再実行をまたいで生きるst.cache_dataを使う（返り値は呼び出しごとにコピーされる）
+@st.cache_data(max_entries=16, show_spinner=False)
+def _mock_result(date_iso: str, hint: str, err: str) -> dict:
+    return {
+        "source_text": f"[{date_iso}] の原文は未記入です。ヒント: {hint or '（なし）'}",
+        "interpolated_text": _MOCK_TMPL.format(date_iso=date_iso, hint=hint or "特になし"),
+        "evidence": [
+            {"type": "weather", "summary": "当日の天候は曇りがち（例）", "source": "open-meteo (mock)"},
+            {"type": "context", "summary": "前週の研究ログから活動推定（例）", "source": "local diary (mock)"},
+        ],
+        "meta": {"mock": True, "error": err},
+        "is_mock": True,
+    }
+
+
+# 同じ(日付, ヒント)での補間はLLM生成をやり直さず1時間キャッシュする。
+# 返り値はpickle可能なプレーンdict（レスポンス形式への変換までここで済ませる）
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_interpolate(date_iso: str, hint: str, _status=None) -> dict:
+    # 補間はネットワーク/LLM待ちが大半なので、ワーカースレッドに投げて
+    # メインのスクリプトスレッドでは経過表示の更新だけを行う
+    request = InterpolationRequest(date=date_iso, hint=hint)
+    future = _INTERPOLATE_EXECUTOR.submit(orchestrator_instance.interpolate, request)
+    waited = 0.0
+    while not future.done():
+        time.sleep(0.25)
+        waited += 0.25
+        if _status is not None:
+            _status.update(label=f"補間中...（{waited:.0f}秒経過）")
+    response = future.result()
+
+    # レスポンス形式をWebUIが期待する形式に変換
+    return {
+        "source_text": "",  # orchestratorからは元の日記テキストは返らないため空
+        "interpolated_text": response.text,
+        "evidence": [{"type": "citation", "summary": f"参照: {c.date}", "source": c.snippet} for c in response.citations],
+        "meta": {"date": response.date},
+        "is_mock": False,
+    }
 
-# 補間アクション
-_do_interpolate = st.button("🔮 補間する", use_container_width=True)
 
 if _do_interpolate:
-    date_iso = to_iso(date_val)
-    with st.spinner("補間中..."):
+    date_iso = date_val.isoformat()
+    with st.status("補間中...", expanded=False) as _status:
         try:
-            # orchestrator_instanceを使用して補間を実行
-            request = InterpolationRequest(date=date_iso, hint=hint_val)
-            response = orchestrator_instance.interpolate(request)
-            
-            # レスポンス形式をWebUIが期待する形式に変換
-            result = {
-                "source_text": "",  # orchestratorからは元の日記テキストは返らないため空
-                "interpolated_text": response.text,
-                "evidence": [{"type": "citation", "summary": f"参照: {c.date}", "source": c.snippet} for c in response.citations],
-                "meta": {"date": response.date},
-                "is_mock": False,
-            }
-        except Exception as e:
-            # エラー時はモックデータを返す
+            result = _cached_interpolate(date_iso, hint_val or "", _status=_status)
+            _status.update(label="補間が完了しました。", state="complete")
+        except (requests.RequestException, ConnectionError, ValueError, RuntimeError) as e:
+            # 想定内の失敗（通信・未初期化・入力不正・推論エラー）だけをモックで
+            # 受ける。KeyboardInterrupt等まで握り潰してセッションに残さない
             st.error(f"補間処理でエラーが発生しました: {e}")
-            result = {
-                "source_text": f"[{date_iso}] の原文は未記入です。ヒント: {hint_val or '（なし）'}",
-                "interpolated_text": f"""{date_iso} の出来事（自動補間）
-- 朝：曇りがち。通学路は静か。
-- 昼：研究を進め、結果を整理。
-- 夕：運動のあと読書でリフレッシュ。
-※ ヒント: {hint_val or '特になし'}""",
-                "evidence": [
-                    {"type": "weather", "summary": "当日の天候は曇りがち（例）", "source": "open-meteo (mock)"},
-                    {"type": "context", "summary": "前週の研究ログから活動推定（例）", "source": "local diary (mock)"},
-                ],
-                "meta": {"mock": True, "error": str(e)},
-                "is_mock": True,
-            }
+            result = _mock_result(date_iso, hint_val or "", str(e)[:80])
         
+        # evidenceの整形JSONは結果の到着時に1度だけ作り、再実行では使い回す
+        ev = result.get("evidence") or []
+        if isinstance(ev, list):
+            result["evidence_pretty"] = [_evidence_pretty(e) for e in ev]
+        else:
+            result["evidence_pretty"] = [_evidence_pretty(ev)]
+
         st.session_state["last_result"] = result
         st.session_state["last_date_iso"] = date_iso
 
 # 結果表示
+# session_stateプロキシの__getitem__は素のdictより重いため、
+# 再実行のたびに触る値は冒頭で一度だけローカルへ写して使い回す
 result = st.session_state.get("last_result")
 date_iso = st.session_state.get("last_date_iso")
 
 if result:
+    src = result["source_text"]
+    interp = result["interpolated_text"]
+    ev = result.get("evidence") or []
+
     st.divider()
     st.subheader(f"📄 {date_iso} の補間結果")
 
+    # 読み取り専用の表示にst.text_areaを使うとdisabledでも
+    # contenteditableなtextareaがレンダリングされて重い。
+    # 固定高さのコンテナ＋st.text（静的な<pre>相当）で軽量に表示する
     left, right = st.columns(2, gap="large")
     with left:
         st.markdown("**原文（左）**")
-        st.text_area("原文", value=result["source_text"], height=260, key="source_text", disabled=True)
+        with st.container(height=260):
+            st.text(src)
 
     with right:
         st.markdown("**補間稿（右）**")
-        st.text_area("補間稿", value=result["interpolated_text"], height=260, key="interp_text", disabled=True)
-
-    with st.expander("🪄 差分（原文 vs 補間稿）を表示"):
-        st.components.v1.html(html_diff(result["source_text"], result["interpolated_text"]), height=320, scrolling=True)
+        with st.container(height=260):
+            st.text(interp)
 
-    with st.expander("🔎 根拠（evidence）を確認"):
-        ev = result.get("evidence") or []
-        if isinstance(ev, list):
-            for i, e in enumerate(ev, start=1):
-                e_json = json.dumps(e, ensure_ascii=False, indent=2)
-                st.markdown(f"**[{i}] {e.get('type', 'info')}** — {e.get('summary','')}")
-                with st.popover(f"詳細を見る #{i}"):
-                    st.code(e_json, language="json")
-        else:
-            st.code(json.dumps(ev, ensure_ascii=False, indent=2), language="json")
+    _render_diff_panel(result)
+    _render_evidence_panel(result)
 
     # 承認・保存
     st.divider()
@@ -219,7 +431,7 @@ if result:
 
     if approve_btn:
         with st.spinner("保存中..."):
-            ok, info = approve_and_save(date_iso, result["interpolated_text"], result.get("evidence", []))
+            ok, info = approve_and_save(date_iso, interp, ev)
             if ok:
                 st.success("保存に成功しました。", icon="✅")
             else: